@@ -1,7 +1,17 @@
+import asyncio
+import hashlib
+import html
 import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
 from datetime import datetime
+from pathlib import Path
 
 import anthropic
+import jiter
 import streamlit as st
 import streamlit.components.v1 as components
 
@@ -13,28 +23,14 @@ st.set_page_config(
 )
 
 # ─── スタイル ─────────────────────────────────────────────────────────────────
-st.markdown("""
-<style>
-.diff-box {
-    font-family: sans-serif;
-    font-size: 0.95rem;
-    line-height: 1.8;
-    padding: 1rem;
-    border-radius: 6px;
-    background: #f9f9f9;
-    border: 1px solid #e0e0e0;
-    white-space: pre-wrap;
-    word-break: break-all;
-}
-.summary-box {
-    background: #fffbe6;
-    border-left: 4px solid #f0b429;
-    border-radius: 4px;
-    padding: 0.6rem 0.9rem;
-    margin-bottom: 1rem;
-}
-</style>
-""", unsafe_allow_html=True)
+@st.cache_resource
+def load_style() -> str:
+    """`.streamlit/style.css` を読み込み、<style> 要素の文字列を返す（プロセスごとに1回）。"""
+    css = (Path(__file__).parent / ".streamlit" / "style.css").read_text(encoding="utf-8")
+    return f"<style>\n{css}</style>"
+
+# Streamlitは再実行のたびに要素を組み直すため、スタイルも毎回出力する必要がある
+st.markdown(load_style(), unsafe_allow_html=True)
 
 # ─── 定数 ─────────────────────────────────────────────────────────────────────
 DOC_TYPES = ["連絡帳", "保育日誌", "ドキュメンテーション", "その他"]
@@ -229,9 +225,53 @@ RESPONSE_SCHEMA = {
     "required": ["corrected_text", "corrections", "summary"],
 }
 
+PROOFREAD_TOOL = {
+    "name": "proofread",
+    "description": "添削結果（修正後の文章・修正箇所の一覧・全体コメント）を返す。",
+    "input_schema": RESPONSE_SCHEMA,
+}
+
+# 文書種別ごとのシステムプロンプトは固定なので、cache_control付きのブロックを起動時に作っておく
+# 注意：claude-haiku-4-5 はプレフィックスが4096トークン以上ないとキャッシュしないため、
+# 現在のプロンプト（最長のドキュメンテーションでも約1700文字＋ツール定義）では効果がない。
+# プロンプトが長くなるか、最小長の短いモデルに切り替えたときに初めて効く。
+SYSTEM_BLOCKS = {
+    doc_type: [{"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}}]
+    for doc_type, prompt in DOC_SYSTEM_PROMPTS.items()
+}
+
+SELF_CHECK_INSTRUCTIONS = (
+    "\n\n添削後、必ず以下を自己チェックしてから回答してください：\n"
+    "①「でしょう」を使っていないか\n"
+    "②同一文内で同じ言葉が2回出ていないか（特に「姿」「子どもたち」に注意）\n"
+    "③時制が全体で統一されているか\n"
+    "④助詞の誤用がないか\n"
+    "⑤一文が長すぎないか\n"
+    "⑥ビジネス・SNS系の絵文字（🗣️🔥💡など）を使っていないか\n"
+    "⑦全体を通して声に出して読んだとき自然に聞こえるか\n"
+    "⑧「〜ましたよ」「〜ですよ」を使っていないか\n"
+    "⑨文末で「。」と絵文字を同時に使っていないか（「〜ました。😊」はNG、「〜ました😊」はOK）\n"
+    "⑩同じ単語が近接する文中で不自然に繰り返されていないか\n"
+    "全チェック完了後に proofread ツールで回答してください。"
+)
+
+# 出力トークン上限：ツール入力は corrected_text（元の文章より長くなりうる）・理由つきの corrections・
+# summary をすべて含むので、入力1文字あたり4トークンで見積もる。打ち切られたら上限で1回だけ再試行する。
+MAX_TOKENS_FLOOR = 1024
+MAX_TOKENS_CEILING = 2048
+MAX_TOKENS_PER_CHAR = 4
+MAX_TOKENS_BASE = 512
+
+HISTORY_MAX_ENTRIES = 20
+
+# 履歴の一括変換で同時に投げるリクエスト数
+BATCH_CONCURRENCY = 5
+
+logger = logging.getLogger(__name__)
+
 # ─── セッション初期化 ──────────────────────────────────────────────────────────
 if "history" not in st.session_state:
-    st.session_state.history = []
+    st.session_state.history = deque(maxlen=HISTORY_MAX_ENTRIES)
 if "current_result" not in st.session_state:
     st.session_state.current_result = None
 if "edited_text" not in st.session_state:
@@ -247,29 +287,78 @@ def get_client():
     except Exception:
         return None
 
-client = get_client()
+# ─── 添削結果キャッシュ ───────────────────────────────────────────────────────
+RESPONSE_CACHE_TTL = 3600
+RESPONSE_CACHE_MAX_ENTRIES = 256
+
+
+class ResponseCache:
+    """添削の入力一式をキーに、APIの結果を保持するLRUキャッシュ。
+
+    同じ文体ボタンの再クリックや履歴からの再添削をAPI呼び出しなしで返す。
+    呼び出し中のキーも覚えておき、先読みと同じリクエストを二重に送らないようにする。
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries: OrderedDict[tuple, tuple[float, dict]] = OrderedDict()
+        # 先読みスレッドとスクリプトスレッドで別のイベントループから待つため、スレッドセーフな Future を使う
+        self._in_flight: dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, key: tuple) -> tuple[Future, bool]:
+        """key の結果を受け取る Future と、呼び出し側がAPIを呼ぶ担当かどうかを返す。
+
+        キャッシュ済みなら完了済みの Future、呼び出し中ならその Future を返す（担当は False）。
+        担当が True のときは、呼び出し側が put か fail で必ず完了させる。
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                stored_at, value = item
+                if time.monotonic() - stored_at <= self._ttl:
+                    self._entries.move_to_end(key)
+                    future = Future()
+                    future.set_result(value)
+                    return future, False
+                del self._entries[key]
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = self._in_flight[key] = Future()
+            return future, True
+
+    def put(self, key: tuple, value: dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+            future = self._in_flight.pop(key, None)
+        if future is not None:
+            future.set_result(value)
+
+    def fail(self, key: tuple, exc: BaseException):
+        with self._lock:
+            future = self._in_flight.pop(key, None)
+        if future is not None:
+            future.set_exception(exc)
+
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    return ResponseCache(RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES)
 
 # ─── ユーティリティ関数 ───────────────────────────────────────────────────────
-def call_proofread_api(
+def _build_request(
     doc_type: str,
     text: str,
-    context: str = "",
-    tone: str | None = None,
-    age_class: str = "未選択",
-) -> dict | None:
-    """Claude APIで添削を実行してJSONを返す。"""
-    if client is None:
-        st.error("APIキーが設定されていません。`.streamlit/secrets.toml` に `ANTHROPIC_API_KEY` を設定してください。")
-        return None
-
-    system_prompt = DOC_SYSTEM_PROMPTS[doc_type]
-    system_prompt += (
-        "\n\n必ず以下のJSON形式のみで返答してください。余分な説明は不要です。\n"
-        '{"corrected_text": "修正後の完全な文章", '
-        '"corrections": [{"original": "元の表現", "corrected": "修正後", "reason": "理由"}], '
-        '"summary": "全体コメント"}'
-    )
-
+    context: str,
+    tone: str | None,
+    age_class: str,
+) -> dict:
+    """添削リクエストの ``messages.stream`` 引数を組み立てる。"""
     user_content = f"【文書種別】{doc_type}\n"
     if context:
         user_content += f"【コンテキスト】{context}\n"
@@ -283,36 +372,184 @@ def call_proofread_api(
             "年齢相応の行動・表現・遊びの描写になるよう修正してください。\n"
         )
     user_content += f"\n【添削対象の文章】\n{text}"
-    user_content += (
-        "\n\n添削後、必ず以下を自己チェックしてから回答してください：\n"
-        "①「でしょう」を使っていないか\n"
-        "②同一文内で同じ言葉が2回出ていないか（特に「姿」「子どもたち」に注意）\n"
-        "③時制が全体で統一されているか\n"
-        "④助詞の誤用がないか\n"
-        "⑤一文が長すぎないか\n"
-        "⑥ビジネス・SNS系の絵文字（🗣️🔥💡など）を使っていないか\n"
-        "⑦全体を通して声に出して読んだとき自然に聞こえるか\n"
-        "⑧「〜ましたよ」「〜ですよ」を使っていないか\n"
-        "⑨文末で「。」と絵文字を同時に使っていないか（「〜ました。😊」はNG、「〜ました😊」はOK）\n"
-        "⑩同じ単語が近接する文中で不自然に繰り返されていないか\n"
-        "全チェック完了後にJSONで回答してください。"
-    )
+    user_content += SELF_CHECK_INSTRUCTIONS
+
+    max_tokens = max(MAX_TOKENS_FLOOR, min(MAX_TOKENS_CEILING, len(text) * MAX_TOKENS_PER_CHAR + MAX_TOKENS_BASE))
+    logger.debug("max_tokens=%d (input %d chars)", max_tokens, len(text))
+
+    return {
+        "model": "claude-haiku-4-5-20251001",
+        "max_tokens": max_tokens,
+        "system": SYSTEM_BLOCKS[doc_type],
+        "messages": [{"role": "user", "content": user_content}],
+        "tools": [PROOFREAD_TOOL],
+        "tool_choice": {"type": "tool", "name": PROOFREAD_TOOL["name"]},
+    }
+
+
+class TruncatedResponseError(ValueError):
+    """出力トークンの上限で応答が打ち切られた。"""
+
+
+def _extract_result(response) -> dict:
+    """応答メッセージから proofread ツールの入力を取り出す。"""
+    if response.stop_reason == "max_tokens":
+        raise TruncatedResponseError("応答が途中で打ち切られました")
+    for block in response.content:
+        if block.type == "tool_use" and block.name == PROOFREAD_TOOL["name"]:
+            if "corrected_text" not in block.input:
+                raise ValueError("corrected_text がありません")
+            return block.input
+    raise ValueError("proofread ツールの呼び出しがありません")
+
+
+def _partial_corrected_text(buf: str) -> str:
+    """受信途中のツール入力JSONから、書きかけの corrected_text を取り出す。
 
+    SDKのスナップショットは閉じていない文字列を落とすため、末尾の文字列も残すモードで読み直す。
+    """
     try:
-        response = client.messages.create(
-            model="claude-haiku-4-5-20251001",
-            max_tokens=2048,
-            system=system_prompt,
-            messages=[{"role": "user", "content": user_content}],
+        partial = jiter.from_json(buf.encode(), partial_mode="trailing-strings")
+    except ValueError:
+        return ""
+    if not isinstance(partial, dict):
+        return ""
+    return partial.get("corrected_text", "")
+
+
+def _retry_request(request: dict, response) -> dict | None:
+    """打ち切られた応答なら、上限まで広げた再試行用のリクエストを返す。"""
+    if response.stop_reason == "max_tokens" and request["max_tokens"] < MAX_TOKENS_CEILING:
+        logger.info("max_tokens=%d で打ち切られたため %d で再試行します", request["max_tokens"], MAX_TOKENS_CEILING)
+        return {**request, "max_tokens": MAX_TOKENS_CEILING}
+    return None
+
+
+def _stream_proofread(client: anthropic.Anthropic, request: dict, placeholder=None):
+    """リクエストをストリーミングで送り、最終メッセージを返す。"""
+    try:
+        with client.messages.stream(**request) as stream:
+            buf = ""
+            shown = ""
+            preview_done = placeholder is None
+            for event in stream:
+                if preview_done or event.type != "input_json":
+                    continue
+                # ツール入力のJSONを受信途中のまま読み、書きかけの修正後文章を先に見せる
+                buf += event.partial_json
+                partial = _partial_corrected_text(buf)
+                # SDKのスナップショットに載ったら文字列は閉じているので、以降は読まない
+                preview_done = "corrected_text" in event.snapshot
+                if partial != shown:
+                    placeholder.markdown(f'<div class="diff-box">{html.escape(partial)}</div>', unsafe_allow_html=True)
+                    shown = partial
+            return stream.get_final_message()
+    finally:
+        if placeholder is not None:
+            placeholder.empty()
+
+
+def _call(client: anthropic.Anthropic, cache: ResponseCache, key: tuple, placeholder=None) -> dict:
+    """key = (doc_type, text, context, tone, age_class) の添削結果を返す（画面からの呼び出し用）。
+
+    キャッシュされた同期クライアントを使うので、呼び出しのたびに接続を張り直さない。
+    キャッシュになければAPIを呼び出し、結果をキャッシュに入れる。
+    同じキーを先読みなどで呼び出し中なら、新たに送らずその結果を待つ。
+    """
+    future, owner = cache.reserve(key)
+    if not owner:
+        return future.result()
+
+    try:
+        request = _build_request(*key)
+        response = _stream_proofread(client, request, placeholder)
+        retry = _retry_request(request, response)
+        if retry is not None:
+            response = _stream_proofread(client, retry, placeholder)
+        result = _extract_result(response)
+    except BaseException as e:
+        cache.fail(key, e)
+        raise
+    cache.put(key, result)
+    return result
+
+
+def _async_client(client: anthropic.Anthropic) -> anthropic.AsyncAnthropic:
+    """同じAPIキーの非同期クライアントを作る（先読み・一括変換用）。
+
+    httpxの非同期接続はイベントループをまたいで使い回せないため、
+    ``asyncio.run`` ごとに作って閉じる。
+    """
+    return anthropic.AsyncAnthropic(api_key=client.api_key)
+
+
+async def _acall(aclient: anthropic.AsyncAnthropic, cache: ResponseCache, key: tuple) -> dict:
+    """_call の非同期版。複数の添削を並行に実行するときに使う（途中経過は表示しない）。"""
+    future, owner = cache.reserve(key)
+    if not owner:
+        return await asyncio.wrap_future(future)
+
+    try:
+        request = _build_request(*key)
+        response = await aclient.messages.create(**request)
+        retry = _retry_request(request, response)
+        if retry is not None:
+            response = await aclient.messages.create(**retry)
+        result = _extract_result(response)
+    except BaseException as e:
+        cache.fail(key, e)
+        raise
+    cache.put(key, result)
+    return result
+
+
+async def _prefetch_tones(client: anthropic.Anthropic, cache: ResponseCache, key: tuple):
+    doc_type, text, context, _, age_class = key
+    async with _async_client(client) as aclient:
+        results = await asyncio.gather(
+            *(_acall(aclient, cache, (doc_type, text, context, tone, age_class)) for tone in TONE_INSTRUCTIONS),
+            return_exceptions=True,
         )
-        raw = response.content[0].text.strip()
-        # コードブロックを除去
-        if raw.startswith("```"):
-            raw = raw.split("```")[1]
-            if raw.startswith("json"):
-                raw = raw[4:]
-        return json.loads(raw)
-    except json.JSONDecodeError:
+    for tone, result in zip(TONE_INSTRUCTIONS, results):
+        if isinstance(result, Exception):
+            logger.warning("文体「%s」の先読みに失敗しました: %s", tone, result)
+
+
+async def _batch_proofread(client: anthropic.Anthropic, cache: ResponseCache, keys: list[tuple]) -> list:
+    sem = asyncio.Semaphore(BATCH_CONCURRENCY)
+    async with _async_client(client) as aclient:
+        async def run(key: tuple) -> dict:
+            async with sem:
+                return await _acall(aclient, cache, key)
+
+        return await asyncio.gather(*(run(key) for key in keys), return_exceptions=True)
+
+
+def call_proofread_api(
+    doc_type: str,
+    text: str,
+    context: str = "",
+    tone: str | None = None,
+    age_class: str = "未選択",
+    placeholder=None,
+) -> dict | None:
+    """Claude APIで添削を実行し、proofread ツールの入力（corrected_text・corrections・summary の辞書）を返す。
+
+    placeholder に ``st.empty()`` を渡すと、受信途中の応答をそこに逐次表示する。
+    同じ入力の結果がキャッシュにあればAPIを呼ばずにそれを返す。
+    """
+    client = get_client()
+    if client is None:
+        st.error("APIキーが設定されていません。`.streamlit/secrets.toml` に `ANTHROPIC_API_KEY` を設定してください。")
+        return None
+
+    key = (doc_type, text, context, tone, age_class)
+    try:
+        return _call(client, get_response_cache(), key, placeholder)
+    except TruncatedResponseError:
+        st.error("文章が長すぎるため、AIの応答が途中で打ち切られました。文章をいくつかに分けて添削してください。")
+        return None
+    except ValueError:
         st.error("AIの応答の解析に失敗しました。もう一度お試しください。")
         return None
     except anthropic.AuthenticationError:
@@ -323,18 +560,121 @@ def call_proofread_api(
         return None
 
 
-def save_to_history(doc_type: str, original: str, result: dict):
+def prefetch_tones(doc_type: str, text: str, context: str = "", age_class: str = "未選択"):
+    """3つの文体調整をバックグラウンドで並行して先に実行し、結果をキャッシュしておく。
+
+    文体ボタンを押したときはキャッシュから即座に結果が返る。
+    """
+    client = get_client()
+    if client is None:
+        return
+    key = (doc_type, text, context, None, age_class)
+    coro = _prefetch_tones(client, get_response_cache(), key)
+    threading.Thread(target=asyncio.run, args=(coro,), daemon=True).start()
+
+
+def batch_proofread(items: list[tuple[str, str, str, str | None, str]]) -> list[dict | None]:
+    """(doc_type, text, context, tone, age_class) の組をまとめて添削する。
+
+    同時実行数を BATCH_CONCURRENCY に絞って並行に呼び出す。
+    結果は items と同じ順で、失敗したものは None になる。
+    """
+    client = get_client()
+    if client is None:
+        st.error("APIキーが設定されていません。`.streamlit/secrets.toml` に `ANTHROPIC_API_KEY` を設定してください。")
+        return [None] * len(items)
+
+    results = asyncio.run(_batch_proofread(client, get_response_cache(), items))
+    for item, result in zip(items, results):
+        if isinstance(result, Exception):
+            logger.warning("一括添削に失敗しました（%s: %s...）: %s", item[0], item[1][:15], result)
+    return [None if isinstance(result, Exception) else result for result in results]
+
+
+def _history_label(timestamp: str, doc_type: str, original: str, tone: str | None, age_class: str = "未選択") -> str:
+    age_mark = f"・{age_class}" if age_class != "未選択" else ""
+    tone_mark = f"〈{tone}〉" if tone else ""
+    return f"{timestamp} [{doc_type}{age_mark}]{tone_mark} {original[:15]}..."
+
+
+def _history_result(result: dict) -> dict:
+    # 復元時にそのまま current_result へ渡せる形で持つ
+    return {
+        "corrected_text": result["corrected_text"],
+        "corrections": result.get("corrections", []),
+        "summary": result.get("summary", ""),
+    }
+
+
+def _history_request(entry: dict) -> tuple[str, str, str, str]:
+    """エントリの添削条件 (doc_type, original, context, age_class) を返す。"""
+    return entry["doc_type"], entry["original"], entry.get("context", ""), entry.get("age_class", "未選択")
+
+
+def save_to_history(
+    doc_type: str,
+    original: str,
+    result: dict,
+    tone: str | None = None,
+    context: str = "",
+    age_class: str = "未選択",
+):
+    history_result = _history_result(result)
+    history = st.session_state.history
+    # 同じ入力の再クリックはキャッシュから同じ結果が返るので、直前と同じなら履歴を増やさない
+    if history:
+        latest = history[0]
+        if (
+            _history_request(latest) == (doc_type, original, context, age_class)
+            and latest.get("tone") == tone
+            and latest["result"] == history_result
+        ):
+            return
+    now = datetime.now()
+    timestamp = now.strftime("%H:%M")
     entry = {
-        "timestamp": datetime.now().strftime("%H:%M"),
+        "timestamp": timestamp,
         "doc_type": doc_type,
+        "tone": tone,
+        "label": _history_label(timestamp, doc_type, original, tone, age_class),
+        # 履歴が増えても変わらないボタンのキー（分単位の時刻だけだと同じ文章の再調整で重複する）
+        "key": hashlib.md5(f"{now.isoformat()}{doc_type}{original}".encode()).hexdigest()[:8],
         "original": original,
-        "corrected": result["corrected_text"],
-        "corrections": result.get("corrections", []),
-        "summary": result.get("summary", ""),
+        # 一括変換で同じ条件のまま添削し直せるよう、添削時の条件も残す
+        "context": context,
+        "age_class": age_class,
+        "result": history_result,
     }
-    st.session_state.history.insert(0, entry)
-    if len(st.session_state.history) > 20:
-        st.session_state.history.pop()
+    history.appendleft(entry)
+
+
+def convert_history_tone(tone: str) -> int:
+    """履歴の文章をまとめて指定の文体に変換し、失敗した件数を返す。
+
+    各エントリは保存時のコンテキスト・クラス年齢のまま添削し直す。
+    新しい履歴は追加せず、条件ごとに最新のエントリを変換結果で置き換える。
+    すでにその文体のエントリがある条件は変換しない。
+    """
+    history = st.session_state.history
+    converted = {_history_request(entry) for entry in history if entry.get("tone") == tone}
+    targets: dict[tuple[str, str, str, str], dict] = {}
+    for entry in history:  # 先頭が最新
+        request = _history_request(entry)
+        if request not in converted:
+            targets.setdefault(request, entry)
+    if not targets:
+        return 0
+
+    items = [(doc, text, context, tone, age_class) for doc, text, context, age_class in targets]
+    results = batch_proofread(items)
+    for entry, result in zip(targets.values(), results):
+        if result:
+            entry["tone"] = tone
+            entry["label"] = _history_label(
+                entry["timestamp"], entry["doc_type"], entry["original"], tone, entry.get("age_class", "未選択")
+            )
+            entry["result"] = _history_result(result)
+    return results.count(None)
 
 
 def render_result(original: str, result: dict):
@@ -344,10 +684,13 @@ def render_result(original: str, result: dict):
 
     # 修正後テキスト表示
     corrected_text = result["corrected_text"]
-    st.markdown(f'<div class="diff-box">{corrected_text}</div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="diff-box">{html.escape(corrected_text)}</div>', unsafe_allow_html=True)
 
     # コピーボタン
-    corrected_json = json.dumps(corrected_text)
+    # <script> 内に埋め込むので、"</script>" などで抜け出せないよう < > & もエスケープする
+    corrected_json = (
+        json.dumps(corrected_text).replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+    )
     copy_html = f"""<button id="copyBtn" onclick="copyToClipboard()" style="padding:4px 12px;cursor:pointer;border:1px solid #ccc;border-radius:4px;background:#fff;">コピー</button>
 <span id="copyMsg" style="color:green;margin-left:8px;"></span>
 <script>
@@ -373,7 +716,7 @@ function copyToClipboard() {{
     # 全体コメント
     summary = result.get("summary", "")
     if summary:
-        st.markdown(f'<div class="summary-box">{summary}</div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="summary-box">{html.escape(summary)}</div>', unsafe_allow_html=True)
 
     # 文体調整ボタン
     st.markdown("**文体を調整する**")
@@ -383,12 +726,14 @@ function copyToClipboard() {{
         with tone_cols[i]:
             if st.button(tone, key=f"tone_{tone}"):
                 with st.spinner(f"「{tone}」に調整中..."):
+                    preview = st.empty()
                     adjusted = call_proofread_api(
                         st.session_state.get("selected_doc_type", "その他"),
                         original,
                         st.session_state.get("context_input", ""),
                         tone=tone,
                         age_class=st.session_state.get("selected_age_class", "未選択"),
+                        placeholder=preview,
                     )
                 if adjusted:
                     st.session_state.current_result = adjusted
@@ -397,6 +742,9 @@ function copyToClipboard() {{
                         st.session_state.get("selected_doc_type", "その他"),
                         original,
                         adjusted,
+                        tone=tone,
+                        context=st.session_state.get("context_input", ""),
+                        age_class=st.session_state.get("selected_age_class", "未選択"),
                     )
                     st.rerun()
 
@@ -412,15 +760,26 @@ with st.sidebar:
     age_class = st.selectbox("クラス年齢", AGE_CLASSES, index=0)
     st.session_state.selected_age_class = age_class
 
+    prefetch_enabled = st.checkbox(
+        "文体調整を先読みする",
+        value=False,
+        help="添削のあと3つの文体調整を裏で実行しておき、ボタンを押したときにすぐ表示します。API利用量は約4倍になります。",
+    )
+
     st.divider()
 
     st.header("添削履歴")
     if not st.session_state.history:
         st.caption("まだ履歴がありません")
     else:
+        if st.button("履歴を一括で〈丁寧〉に変換", use_container_width=True):
+            with st.spinner("履歴を〈丁寧〉に変換中..."):
+                failed = convert_history_tone("丁寧")
+            if failed:
+                st.warning(f"{failed} 件の変換に失敗しました。")
+
         for idx, entry in enumerate(st.session_state.history):
-            label = f"{entry['timestamp']} [{entry['doc_type']}] {entry['original'][:15]}..."
-            if st.button(label, key=f"hist_{idx}", use_container_width=True):
+            if st.button(entry["label"], key=f"hist_{entry['key']}", use_container_width=True):
                 st.session_state.restore_index = idx
                 st.rerun()
 
@@ -435,12 +794,8 @@ if st.session_state.restore_index is not None:
     if 0 <= idx < len(st.session_state.history):
         entry = st.session_state.history[idx]
         restore_text = entry["original"]
-        st.session_state.current_result = {
-            "corrected_text": entry["corrected"],
-            "corrections": entry["corrections"],
-            "summary": entry["summary"],
-        }
-        st.session_state.edited_text = entry["corrected"]
+        st.session_state.current_result = entry["result"]
+        st.session_state.edited_text = entry["result"]["corrected_text"]
     st.session_state.restore_index = None
 
 input_text = st.text_area(
@@ -474,11 +829,14 @@ if proofread_clicked:
     else:
         st.session_state.tone_adjusted = False
         with st.spinner("添削中..."):
-            result = call_proofread_api(doc_type, input_text, age_class=age_class)
+            preview = st.empty()
+            result = call_proofread_api(doc_type, input_text, age_class=age_class, placeholder=preview)
         if result:
             st.session_state.current_result = result
             st.session_state.edited_text = result["corrected_text"]
-            save_to_history(doc_type, input_text, result)
+            save_to_history(doc_type, input_text, result, age_class=age_class)
+            if prefetch_enabled:
+                prefetch_tones(doc_type, input_text, age_class=age_class)
 
 if st.session_state.current_result:
     original = input_text or restore_text